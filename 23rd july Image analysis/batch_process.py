@@ -0,0 +1,233 @@
+"""
+Batch image processing CLI
+Runs the np_image.py products (channel split, grayscale, colormap) over whole
+directories of images in a process pool and writes PNGs to disk.
+
+Images are identified by content hash, so re-running skips anything already
+processed, even if it was renamed or moved.
+
+Usage:
+    python batch_process.py photos/ --out-dir products --colormap inferno --workers 4
+    python batch_process.py --file-list images.txt --out-dir products
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from PIL import Image
+
+from image_pipeline import ImagePipeline
+from image_pyramid import file_content_hash
+from image_stats import summary
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp", ".ppm"}
+MANIFEST_NAME = "manifest.jsonl"
+STAGES = ["hash", "decode", "channels", "gray", "stats", "colormap", "write"]
+
+# Reported stages in terms of image_pipeline stages
+STAGE_GROUPS = {
+    "decode": ("image", "array"),
+    "channels": ("red", "green", "blue"),
+    "gray": ("gray",),
+    "stats": ("histograms", "stats"),
+    "colormap": ("colormap",),
+}
+
+
+def iter_image_paths(directory: Path, recursive: bool = True, exclude: Optional[Path] = None) -> Iterator[Path]:
+    """Image files under a directory, in a stable order, skipping anything under exclude"""
+    pattern = "**/*" if recursive else "*"
+    exclude = exclude.resolve() if exclude is not None else None
+    for path in sorted(directory.glob(pattern)):
+        if exclude is not None and path.resolve().is_relative_to(exclude):
+            # Don't feed our own outputs back in when --out-dir is inside the input
+            continue
+        if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS:
+            yield path
+
+
+def read_file_list(list_path: Path) -> Iterator[Path]:
+    """Paths from a text file, one per line (blank lines and # comments skipped)"""
+    with open(list_path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield Path(line)
+
+
+def load_manifest(out_dir: Path, colormap: str) -> Dict[str, dict]:
+    """Images already processed with this colormap, keyed by content hash"""
+    manifest_path = out_dir / MANIFEST_NAME
+    done = {}
+    if manifest_path.exists():
+        with open(manifest_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write leaves a truncated last line
+                    continue
+                if record.get("colormap") == colormap:
+                    done[record["hash"]] = record
+    return done
+
+
+def process_image(path: str, digest: str, out_dir: str, colormap: str) -> dict:
+    """Worker: produce and save every product for one image, timing each stage"""
+    timings = {}
+
+    def load():
+        with Image.open(path) as im:
+            return im.convert("RGB")
+
+    # Same lazy stage graph as the apps; nothing is shared between images, so no cache
+    pipeline = ImagePipeline(digest, load, cache=None, colormap=colormap)
+    outputs = {
+        "red": pipeline.get("red"),
+        "green": pipeline.get("green"),
+        "blue": pipeline.get("blue"),
+        "gray": pipeline.get("gray"),
+        f"colormap_{colormap}": pipeline.get("colormap"),
+    }
+    stats = summary(pipeline.get("stats"))
+    for stage, pipeline_stages in STAGE_GROUPS.items():
+        timings[stage] = sum(pipeline.timings.get(name, 0.0) for name in pipeline_stages)
+
+    start = time.perf_counter()
+    target = Path(out_dir) / digest
+    target.mkdir(parents=True, exist_ok=True)
+    for name, array in outputs.items():
+        Image.fromarray(array).save(target / f"{name}.png")
+    timings["write"] = time.perf_counter() - start
+
+    return {
+        "path": path,
+        "hash": digest,
+        "colormap": colormap,
+        "shape": list(pipeline.get("array").shape),
+        "outputs": sorted(f"{name}.png" for name in outputs),
+        "stats": stats,
+        "timings": timings,
+    }
+
+
+def run_batch(
+    paths: Iterable[Path],
+    out_dir: Path,
+    colormap: str = "viridis",
+    workers: int = 1,
+    max_in_flight: int = 0,
+) -> dict:
+    """Process images with at most max_in_flight tasks queued; returns a summary
+
+    Images are hashed here in the parent so that only new content is sent to
+    the pool: already-processed images and repeats within this run are skipped
+    without a task.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    seen_hashes = set(load_manifest(out_dir, colormap))
+    max_in_flight = max_in_flight or workers * 2
+
+    processed, skipped, failed = 0, 0, []
+    stage_totals = {stage: 0.0 for stage in STAGES}
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            open(out_dir / MANIFEST_NAME, "a") as manifest:
+
+        def collect(done_futures):
+            nonlocal processed
+            for future in done_futures:
+                path = in_flight.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    failed.append({"path": str(path), "error": str(e)})
+                    print(f"FAILED  {path}: {e}")
+                    continue
+                for stage, seconds in record["timings"].items():
+                    stage_totals[stage] += seconds
+                processed += 1
+                manifest.write(json.dumps(record) + "\n")
+                manifest.flush()
+                print(f"done    {path} -> {record['hash']}")
+
+        in_flight = {}
+        for path in paths:
+            hash_start = time.perf_counter()
+            try:
+                digest = file_content_hash(path)
+            except OSError as e:
+                failed.append({"path": str(path), "error": str(e)})
+                print(f"FAILED  {path}: {e}")
+                continue
+            stage_totals["hash"] += time.perf_counter() - hash_start
+            if digest in seen_hashes:
+                skipped += 1
+                continue
+            seen_hashes.add(digest)
+
+            # Bounded queue: never hold more than max_in_flight pending tasks
+            if len(in_flight) >= max_in_flight:
+                done_futures, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done_futures)
+            future = executor.submit(process_image, str(path), digest, str(out_dir), colormap)
+            in_flight[future] = path
+        while in_flight:
+            done_futures, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done_futures)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "processed": processed,
+        "skipped": skipped,
+        "failed": failed,
+        "elapsed": elapsed,
+        "images_per_second": processed / elapsed if elapsed > 0 else 0.0,
+        "stage_seconds": stage_totals,
+    }
+
+
+def print_summary(summary: dict):
+    """Print throughput and per-stage timing"""
+    print()
+    print(f"Processed: {summary['processed']}  Skipped: {summary['skipped']}  Failed: {len(summary['failed'])}")
+    print(f"Elapsed:   {summary['elapsed']:.2f} s  ({summary['images_per_second']:.2f} images/s)")
+    total = sum(summary["stage_seconds"].values()) or 1.0
+    print("Stage time (summed over workers):")
+    for stage in STAGES:
+        seconds = summary["stage_seconds"][stage]
+        print(f"  {stage:<9} {seconds:8.2f} s  {100 * seconds / total:5.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch channel / grayscale / colormap processing")
+    parser.add_argument("directory", nargs="?", help="Directory of images to process")
+    parser.add_argument("--file-list", help="Text file with one image path per line")
+    parser.add_argument("--out-dir", required=True, help="Where products and the manifest are written")
+    parser.add_argument("--colormap", default="viridis")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-in-flight", type=int, default=0, help="Pending task limit (default: 2 x workers)")
+    parser.add_argument("--no-recursive", action="store_true", help="Do not descend into subdirectories")
+    args = parser.parse_args()
+
+    if not args.directory and not args.file_list:
+        parser.error("give a directory or --file-list")
+
+    paths: List[Path] = []
+    if args.directory:
+        paths.extend(iter_image_paths(Path(args.directory), not args.no_recursive, Path(args.out_dir)))
+    if args.file_list:
+        paths.extend(read_file_list(Path(args.file_list)))
+
+    summary = run_batch(paths, Path(args.out_dir), args.colormap, args.workers, args.max_in_flight)
+    print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Colormap rendering benchmark
+Compares the old per-rerun Matplotlib figure path against the lookup-table renderer.
+
+Usage:
+    python bench_colormap.py --width 1920 --height 1080 --repeat 5
+"""
+
+import argparse
+import time
+from io import BytesIO
+
+import numpy as np
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from colormap_lut import apply_colormap, get_lut
+
+
+def render_matplotlib(gray: np.ndarray, colormap: str) -> bytes:
+    """Old path: new figure + imshow, serialized to PNG like st.pyplot does"""
+    fig, ax = plt.subplots(figsize=(6, 4))
+    ax.imshow(gray, cmap=colormap)
+    ax.axis("off")
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def render_lut(gray: np.ndarray, colormap: str) -> np.ndarray:
+    """New path: one LUT gather, the array goes straight to st.image"""
+    return apply_colormap(gray, colormap)
+
+
+def time_it(func, repeat: int) -> float:
+    """Best-of-N wall time in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark colormap rendering paths")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--colormap", default="viridis")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 256, size=(args.height, args.width), dtype=np.uint8)
+
+    # Build the table once so we time steady-state reruns
+    get_lut(args.colormap)
+
+    mpl_time = time_it(lambda: render_matplotlib(gray, args.colormap), args.repeat)
+    lut_time = time_it(lambda: render_lut(gray, args.colormap), args.repeat)
+
+    print(f"Image: {args.width}x{args.height}, colormap: {args.colormap}")
+    print(f"matplotlib figure : {mpl_time * 1000:8.2f} ms")
+    print(f"lookup table      : {lut_time * 1000:8.2f} ms")
+    print(f"speedup           : {mpl_time / lut_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""
+Image pipeline benchmark
+Times every stage of the image apps - fetch, decode, np.array, channels,
+grayscale, colormap rendering and st.image-style serialization - on a
+generated offline corpus, for both the original eager path and the current
+pyramid/pipeline path, and writes JSON that later runs can be compared against.
+
+Memory per stage is reported two ways:
+- rss_peak_bytes: growth of the process's resident set during the stage,
+  sampled from /proc/self/statm (None where /proc is missing). This is the
+  number that includes Pillow's decode and encode buffers.
+- traced_peak_bytes: tracemalloc peak, which only sees Python and NumPy
+  allocations, never Pillow's.
+Each path and resolution runs in its own subprocess, so max_rss_bytes in the
+totals is that run's own whole-process peak.
+
+Usage:
+    python bench_pipeline.py --output bench.json
+    python bench_pipeline.py --output new.json --baseline bench.json --fail-on-regression
+"""
+
+import argparse
+import functools
+import multiprocessing
+import os
+import http.server
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import requests
+from PIL import Image
+
+from image_cache import DerivedCache
+from image_fetch import ImageFetcher
+from image_pipeline import ImagePipeline
+from image_pyramid import COLUMN_DISPLAY_WIDTH, ORIGINAL_DISPLAY_WIDTH, ImagePyramid
+
+DEFAULT_RESOLUTIONS = ["640x480", "1920x1080", "4000x3000"]
+LARGE_RESOLUTIONS = ["8000x6000"]
+COLORMAP = "viridis"
+
+# A stage gets (state dict) and stores its outputs back into it
+Stage = Tuple[str, Callable[[dict], None]]
+
+
+def make_synthetic_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Smooth gradients plus texture and noise, so JPEG sizes look like photos"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    x /= width
+    y /= height
+    red = 128 + 100 * np.sin(6.0 * x + 2.0 * y)
+    green = 128 + 100 * np.cos(4.0 * y - 3.0 * x)
+    blue = 128 + 100 * np.sin(10.0 * x * y)
+    rgb = np.stack([red, green, blue], axis=-1)
+    rgb += rng.normal(0, 12, size=rgb.shape).astype(np.float32)
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8))
+
+
+def build_corpus(corpus_dir: Path, resolutions: List[str]) -> Dict[str, Path]:
+    """Write one JPEG per resolution (reused if already there)"""
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    files = {}
+    for resolution in resolutions:
+        width, height = (int(v) for v in resolution.split("x"))
+        path = corpus_dir / f"synthetic_{resolution}.jpg"
+        if not path.exists():
+            make_synthetic_image(width, height).save(path, quality=90)
+        files[resolution] = path
+    return files
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    """Static file server without per-request logging"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(directory: Path) -> Tuple[http.server.ThreadingHTTPServer, str]:
+    """Local stand-in for the image host; returns (server, base_url)"""
+    handler = functools.partial(QuietHandler, directory=str(directory))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def encode_png(array) -> int:
+    """Encode like st.image does before sending; returns payload bytes"""
+    buffer = BytesIO()
+    Image.fromarray(np.asarray(array)).save(buffer, format="PNG")
+    return buffer.tell()
+
+
+def old_path_stages(url: str) -> List[Stage]:
+    """The apps as originally written: full decode, eager products, Matplotlib figure"""
+    def fetch(state):
+        state["content"] = requests.get(url, timeout=30).content
+
+    def decode(state):
+        state["image"] = Image.open(BytesIO(state["content"])).convert("RGB")
+
+    def to_array(state):
+        state["array"] = np.array(state["image"])
+
+    def channels(state):
+        array = state["array"]
+        state["channels"] = []
+        for k in range(3):
+            channel = np.zeros_like(array)
+            channel[:, :, k] = array[:, :, k]
+            state["channels"].append(channel)
+
+    def gray(state):
+        state["gray"] = np.array(state["image"].convert("L"))
+
+    def colormap(state):
+        fig, ax = plt.subplots(figsize=(6, 4))
+        ax.imshow(state["gray"], cmap=COLORMAP)
+        plt.axis("off")
+        buffer = BytesIO()
+        fig.savefig(buffer, format="png")
+        plt.close(fig)
+        state["payload"] = buffer.tell()
+
+    def serialize(state):
+        state["payload"] += encode_png(state["array"])
+        state["payload"] += sum(encode_png(channel) for channel in state["channels"])
+
+    return [
+        ("fetch", fetch), ("decode", decode), ("np.array", to_array), ("channels", channels),
+        ("gray", gray), ("colormap", colormap), ("serialize", serialize),
+    ]
+
+
+def new_path_stages(url: str, cache_dir: Path) -> List[Stage]:
+    """Current apps: cached fetch, pyramid preview decode, lazy pipeline, LUT colormap"""
+    fetcher = ImageFetcher(cache_dir=cache_dir)
+
+    def fetch(state):
+        state["fetched"] = fetcher.fetch(url)
+
+    def decode(state):
+        result = state["fetched"]
+        pyramid = ImagePyramid(result.path, result.content_hash, cache=DerivedCache())
+        state["display_level"] = pyramid.level_for_width(ORIGINAL_DISPLAY_WIDTH)
+        state["column_level"] = pyramid.level_for_width(COLUMN_DISPLAY_WIDTH)
+        state["display_image"] = pyramid.get_level(state["display_level"])
+        state["column_image"] = pyramid.get_level(state["column_level"])
+
+    def to_array(state):
+        key = state["fetched"].content_hash
+        state["display"] = ImagePipeline(key, lambda: state["display_image"], cache=None, colormap=COLORMAP)
+        state["column"] = ImagePipeline(key, lambda: state["column_image"], cache=None)
+        state["display"].get("array")
+        state["column"].get("array")
+
+    def channels(state):
+        state["channels"] = [state["column"].get(name) for name in ("red", "green", "blue")]
+
+    def gray(state):
+        state["display"].get("gray")
+
+    def colormap(state):
+        state["colored"] = state["display"].get("colormap")
+
+    def serialize(state):
+        state["payload"] = encode_png(state["display_image"]) + encode_png(state["colored"])
+        state["payload"] += sum(encode_png(channel) for channel in state["channels"])
+
+    return [
+        ("fetch", fetch), ("decode", decode), ("np.array", to_array), ("channels", channels),
+        ("gray", gray), ("colormap", colormap), ("serialize", serialize),
+    ]
+
+
+class RSSSampler:
+    """Polls resident memory on a thread; peak() is the highest value since reset()"""
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.available = os.path.exists("/proc/self/statm")
+        self._peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def rss() -> int:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, self.rss())
+
+    def __enter__(self):
+        if self.available:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self.available:
+            self._thread.join()
+
+    def reset(self) -> Optional[int]:
+        """Start a new measurement; returns the current RSS"""
+        if not self.available:
+            return None
+        self._peak = current = self.rss()
+        return current
+
+    def peak(self) -> Optional[int]:
+        if not self.available:
+            return None
+        # Also take a reading now, in case the stage was shorter than the interval
+        self._peak = max(self._peak, self.rss())
+        return self._peak
+
+
+def run_stages(stages: List[Stage], repeat: int) -> Dict[str, dict]:
+    """One run measuring RSS per stage, median wall time over repeat runs, then a traced run"""
+    # Measured first, while the process is fresh, so the stages cannot
+    # reuse pages freed by earlier runs
+    traced, rss = {}, {}
+    state: dict = {}
+    with RSSSampler() as sampler:
+        for name, func in stages:
+            start_rss = sampler.reset()
+            func(state)
+            peak = sampler.peak()
+            rss[name] = None if peak is None else peak - start_rss
+    times: Dict[str, List[float]] = {name: [] for name, _ in stages}
+    payload = 0
+    for _ in range(repeat):
+        state = {}
+        for name, func in stages:
+            start = time.perf_counter()
+            func(state)
+            times[name].append(time.perf_counter() - start)
+        payload = state.get("payload", 0)
+
+    # Separate traced run: tracemalloc's own bookkeeping would inflate RSS
+    state = {}
+    tracemalloc.start()
+    for name, func in stages:
+        tracemalloc.reset_peak()
+        func(state)
+        traced[name] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    results = {
+        name: {
+            "seconds": statistics.median(times[name]),
+            "rss_peak_bytes": rss[name],
+            "traced_peak_bytes": traced[name],
+        }
+        for name, _ in stages
+    }
+    results["total"] = {
+        "seconds": sum(r["seconds"] for r in results.values()),
+        "traced_peak_bytes": max(traced.values()),
+        "max_rss_bytes": _max_rss_bytes(),
+        "payload_bytes": payload,
+    }
+    return results
+
+
+def run_path(path_name: str, url: str, repeat: int) -> Dict[str, dict]:
+    """Benchmark one path in the current process (the subprocess entry point)"""
+    matplotlib.use("Agg")
+    if path_name == "old":
+        return run_stages(old_path_stages(url), repeat)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        return run_stages(new_path_stages(url, Path(cache_dir)), repeat)
+
+
+def run_path_isolated(path_name: str, url: str, repeat: int) -> Dict[str, dict]:
+    """run_path in a fresh interpreter, so RSS is not shared with earlier runs"""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(run_path, path_name, url, repeat).result()
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_ms: float) -> List[str]:
+    """Print stage ratios against a baseline run; returns the regressions
+
+    A stage regresses when it is more than tolerance slower and also more than
+    min_ms slower in absolute terms, so millisecond-level noise is ignored.
+    """
+    regressions = []
+    print(f"\nComparison with baseline (regression = >{tolerance:.0%} and >{min_ms:g} ms slower)")
+    for resolution, paths in current["results"].items():
+        for path_name, stages in paths.items():
+            base_stages = baseline.get("results", {}).get(resolution, {}).get(path_name)
+            if not base_stages:
+                continue
+            for stage, values in stages.items():
+                base = base_stages.get(stage)
+                if not base or base["seconds"] <= 0:
+                    continue
+                ratio = values["seconds"] / base["seconds"]
+                flag = ""
+                delta_ms = (values["seconds"] - base["seconds"]) * 1000
+                if ratio > 1 + tolerance and delta_ms > min_ms:
+                    flag = "  <-- regression"
+                    regressions.append(f"{resolution}/{path_name}/{stage}")
+                print(f"  {resolution:>10} {path_name:<4} {stage:<10} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def _mb(value: Optional[int]) -> str:
+    return "n/a" if value is None else f"{value / 2**20:.1f}"
+
+
+def print_results(results: dict):
+    """Side-by-side table of old vs new per resolution
+
+    RSS columns are resident-set growth during the stage (includes Pillow);
+    py columns are the tracemalloc peak (Python/NumPy allocations only).
+    """
+    for resolution, paths in results.items():
+        print(f"\n{resolution}")
+        print(f"  {'stage':<10} {'old ms':>8} {'new ms':>8} {'old RSS MB':>11} {'new RSS MB':>11} "
+              f"{'old py MB':>10} {'new py MB':>10}")
+        for stage in paths["old"]:
+            old, new = paths["old"][stage], paths["new"][stage]
+            if stage == "total":
+                print(f"  {'max RSS':<10} {'':>8} {'':>8} {_mb(old['max_rss_bytes']):>11} "
+                      f"{_mb(new['max_rss_bytes']):>11}")
+                continue
+            print(f"  {stage:<10} {old['seconds'] * 1000:8.1f} {new['seconds'] * 1000:8.1f} "
+                  f"{_mb(old['rss_peak_bytes']):>11} {_mb(new['rss_peak_bytes']):>11} "
+                  f"{_mb(old['traced_peak_bytes']):>10} {_mb(new['traced_peak_bytes']):>10}")
+        print(f"  {'payload':<10} {paths['old']['total']['payload_bytes'] / 1024:7.0f}K "
+              f"{paths['new']['total']['payload_bytes'] / 1024:7.0f}K")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the image app stages")
+    parser.add_argument("--resolutions", nargs="+", default=DEFAULT_RESOLUTIONS, help="WIDTHxHEIGHT list")
+    parser.add_argument("--large", action="store_true", help=f"Also run {', '.join(LARGE_RESOLUTIONS)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--corpus-dir", default=str(Path(tempfile.gettempdir()) / "image_bench_corpus"))
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Earlier JSON output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs baseline")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    resolutions = args.resolutions + (LARGE_RESOLUTIONS if args.large else [])
+    corpus = build_corpus(Path(args.corpus_dir), resolutions)
+    server, base_url = serve_directory(Path(args.corpus_dir))
+
+    results = {}
+    try:
+        for resolution, path in corpus.items():
+            url = f"{base_url}/{path.name}"
+            results[resolution] = {
+                name: run_path_isolated(name, url, args.repeat) for name in ("old", "new")
+            }
+    finally:
+        server.shutdown()
+
+    output = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pillow": Image.__version__,
+            "repeat": args.repeat,
+            "memory": "rss_peak_bytes: RSS growth per stage (includes Pillow); "
+                      "traced_peak_bytes: tracemalloc, Python/NumPy only; "
+                      "max_rss_bytes: whole subprocess per path and resolution",
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+
+    print_results(results)
+    print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(output, baseline, args.tolerance, args.min_ms)
+        if regressions and args.fail_on_regression:
+            sys.exit(f"{len(regressions)} stage(s) regressed")
+
+
+def _max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+if __name__ == "__main__":
+    main()
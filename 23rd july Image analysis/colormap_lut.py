@@ -0,0 +1,63 @@
+import functools
+from typing import Optional, Tuple
+
+import numpy as np
+import matplotlib
+
+# Colormaps offered in the Streamlit apps
+COLORMAPS = ["viridis", "plasma", "inferno", "magma", "cividis", "hot", "cool", "gray"]
+
+
+@functools.lru_cache(maxsize=None)
+def get_lut(name: str) -> np.ndarray:
+    """Return the 256-entry uint8 RGB lookup table for a Matplotlib colormap"""
+    cmap = matplotlib.colormaps[name].resampled(256)
+    lut = cmap(np.arange(256), bytes=True)[:, :3]
+    lut.setflags(write=False)
+    return lut
+
+
+def _stretch_index(lo: int, hi: int) -> np.ndarray:
+    """Map gray values to colormap rows the way imshow's default Normalize does"""
+    values = np.arange(256, dtype=np.float64)
+    if hi <= lo:
+        return np.zeros(256, dtype=np.intp)
+    scaled = (values - lo) / (hi - lo)
+    return np.clip((scaled * 256).astype(np.intp), 0, 255)
+
+
+def gray_range(gray: np.ndarray) -> Tuple[int, int]:
+    """Get the (min, max) gray level present in the image"""
+    return int(gray.min()), int(gray.max())
+
+
+def scaled_lut(name: str, lo: int = 0, hi: int = 255) -> np.ndarray:
+    """Lookup table with the [lo, hi] gray range stretched over the whole colormap"""
+    lut = get_lut(name)
+    if (lo, hi) != (0, 255):
+        lut = lut[_stretch_index(lo, hi)]
+    return lut
+
+
+def apply_colormap(
+    gray: np.ndarray,
+    name: str,
+    autoscale: bool = True,
+    value_range: Optional[Tuple[int, int]] = None,
+) -> np.ndarray:
+    """Colormap a uint8 grayscale array into an (H, W, 3) uint8 RGB image
+
+    With autoscale the data range is stretched over the whole colormap, which
+    matches what ``plt.imshow(gray, cmap=name)`` shows. Pass value_range to
+    stretch with a known range instead (e.g. the global range when colormapping
+    one tile of a larger image).
+    """
+    if gray.dtype != np.uint8:
+        raise ValueError(f"Expected a uint8 grayscale array, got {gray.dtype}")
+
+    if value_range is None:
+        value_range = gray_range(gray) if autoscale else (0, 255)
+    lut = scaled_lut(name, *value_range)
+
+    # One vectorized gather does the whole image
+    return lut[gray]
@@ -0,0 +1,140 @@
+"""
+Streaming channel / colormap analysis for frame sequences
+
+Animated GIFs, multi-page TIFFs and directories of numbered frames are
+decoded one frame at a time on a worker thread. Results pass through a
+bounded queue, so memory stays flat however many frames there are.
+
+Usage:
+    python frame_stream.py clip.gif --out-dir clip_frames --colormap magma
+    python frame_stream.py frames/ --stats-only
+"""
+
+import argparse
+import json
+import queue
+import re
+import threading
+from pathlib import Path
+from typing import Iterator, Sequence, Tuple, Union
+
+from PIL import Image, ImageSequence
+
+from image_pipeline import ImagePipeline
+from image_stats import summary
+
+FRAME_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".ppm"}
+DEFAULT_PRODUCTS = ("red", "green", "blue", "colormap", "stats")
+
+_SENTINEL = object()
+
+
+def _natural_key(path: Path):
+    """Sort frame_2 before frame_10"""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", path.name)]
+
+
+def iter_frames(source: Union[str, Path]) -> Iterator[Tuple[int, Image.Image]]:
+    """Yield (index, RGB frame) one at a time from a multi-frame file or a frame directory"""
+    source = Path(source)
+    if source.is_dir():
+        paths = sorted(
+            (p for p in source.iterdir() if p.is_file() and p.suffix.lower() in FRAME_EXTENSIONS),
+            key=_natural_key,
+        )
+        for index, path in enumerate(paths):
+            with Image.open(path) as im:
+                yield index, im.convert("RGB")
+        return
+
+    with Image.open(source) as im:
+        for index, frame in enumerate(ImageSequence.Iterator(im)):
+            # convert() copies the frame, so seeking on does not change it
+            yield index, frame.convert("RGB")
+
+
+def stream_analysis(
+    source: Union[str, Path],
+    colormap: str = "viridis",
+    products: Sequence[str] = DEFAULT_PRODUCTS,
+    prefetch: int = 4,
+) -> Iterator[dict]:
+    """Yield {"index": i, <product>: value, ...} per frame as soon as it is ready
+
+    Decoding and processing run on a worker thread at most prefetch frames
+    ahead of the consumer.
+    """
+    results: "queue.Queue" = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Wake up periodically so an abandoned stream lets the worker exit
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            for index, frame in iter_frames(source):
+                pipeline = ImagePipeline(f"frame-{index}", lambda: frame, cache=None, colormap=colormap)
+                result = {"index": index, "size": frame.size}
+                result.update({name: pipeline.get(name) for name in products})
+                if not put(result):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        put(_SENTINEL)
+
+    thread = threading.Thread(target=worker, name="frame-stream", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _SENTINEL:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming per-frame channel / colormap analysis")
+    parser.add_argument("source", help="Animated GIF, multi-page TIFF or directory of numbered frames")
+    parser.add_argument("--out-dir", default=None, help="Write per-frame PNGs here")
+    parser.add_argument("--colormap", default="viridis")
+    parser.add_argument("--prefetch", type=int, default=4, help="Frames decoded ahead of the writer")
+    parser.add_argument("--stats-only", action="store_true", help="Only compute statistics")
+    args = parser.parse_args()
+
+    products = ("stats",) if args.stats_only else DEFAULT_PRODUCTS
+    out_dir = Path(args.out_dir) if args.out_dir else None
+    if out_dir is not None:
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+    count = 0
+    for result in stream_analysis(args.source, args.colormap, products, args.prefetch):
+        index = result["index"]
+        stats = summary(result["stats"])
+        if out_dir is not None:
+            for name in products:
+                if name != "stats":
+                    Image.fromarray(result[name]).save(out_dir / f"frame_{index:05d}_{name}.png")
+            with open(out_dir / f"frame_{index:05d}_stats.json", "w") as f:
+                json.dump(stats, f, indent=2)
+        gray = stats["gray"]
+        print(f"frame {index:5d}  {result['size'][0]}x{result['size'][1]}  "
+              f"gray mean {gray['mean']:6.1f}  std {gray['std']:5.1f}")
+        count += 1
+    print(f"{count} frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+import numpy as np
+
+# Default budget for derived products shared by every session in the process
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bytes Pillow allocates per pixel, for the modes that use less than 4
+_PIL_PIXEL_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16L": 2, "I;16B": 2, "I;16N": 2}
+
+
+def new_hasher():
+    """Hasher used for content keys, usable incrementally while streaming"""
+    return hashlib.blake2b(digest_size=16)
+
+
+def estimate_nbytes(value: Any) -> int:
+    """Approximate memory held by a cached value"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if hasattr(value, "getbands") and hasattr(value, "size"):
+        # PIL image: Pillow pads every multi-band mode (RGB, LA, YCbCr, ...)
+        # and I / F to 4 bytes per pixel; only 1 / L / P and I;16 are smaller
+        width, height = value.size
+        return width * height * _PIL_PIXEL_BYTES.get(value.mode, 4)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(v) for v in value.values()) + sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_nbytes(v) for v in value) + sys.getsizeof(value)
+    return sys.getsizeof(value)
+
+
+def freeze(value: Any):
+    """Mark every NumPy array in value (including inside tuples, lists and dicts) read-only"""
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, dict):
+        for v in value.values():
+            freeze(v)
+    elif isinstance(value, (tuple, list)):
+        for v in value:
+            freeze(v)
+
+
+class DerivedCache:
+    """LRU cache of derived image products, bounded by total bytes
+
+    Cached values are shared between sessions and must be treated as
+    read-only. put() enforces this for NumPy arrays by clearing their
+    writeable flag in place, so the caller's own reference becomes read-only
+    too; copy first if you still need to modify it. PIL images (pyramid
+    levels) can't be frozen, so never draw on or paste into an image returned
+    from the cache; take image.copy() first.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(source_hash: str, operation: str, **params) -> Tuple:
+        """Build a key from the source content hash, operation and its parameters"""
+        return (source_hash, operation, tuple(sorted(params.items())))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a cached value (or None) and mark it as recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Get a cached value (or None) without touching hit/miss stats or LRU order
+
+        For internal probes (lock re-checks, looking for reusable entries) that
+        would otherwise show up as misses.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting least recently used entries to stay in budget
+
+        Arrays in value are made read-only (see the class docstring).
+        """
+        size = estimate_nbytes(value)
+        if size > self.max_bytes:
+            # Never let one oversized product flush the whole cache, but don't
+            # keep serving a stale value for this key either
+            with self._lock:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self.current_bytes -= old[1]
+            return
+        freeze(value)
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def get_stats(self) -> dict:
+        """Get cache counters for display"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Process-wide instance shared by every Streamlit session
+derived_cache = DerivedCache()
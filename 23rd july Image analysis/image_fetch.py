@@ -0,0 +1,288 @@
+"""
+Shared image fetch layer
+Pooled HTTP session, timeouts, size-capped streaming downloads, an on-disk cache
+revalidated with ETag / Last-Modified, and concurrent prefetch. The cache is
+pruned by age and total size after every download.
+
+Any base URL works, so the fetcher can be pointed at a local http.server in tests.
+URLs chosen by app visitors should go through fetch(url, url_check=check_public_url),
+which refuses non-http(s) schemes and hosts that resolve to loopback, private or
+link-local addresses, on the first request and on every redirect.
+"""
+
+import hashlib
+import ipaddress
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image
+
+from image_cache import new_hasher
+
+DEFAULT_TIMEOUT = (5.0, 30.0)  # (connect, read) seconds
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+MAX_REDIRECTS = 5
+
+
+class FetchError(Exception):
+    """Raised when an image cannot be downloaded"""
+
+
+class ImageTooLargeError(FetchError):
+    """Raised when a response exceeds the configured size limit"""
+
+
+class BlockedURLError(FetchError):
+    """Raised when a URL fails the caller's url_check"""
+
+
+def check_public_url(url: str):
+    """Allow only http(s) URLs whose host resolves to public addresses
+
+    The check resolves the name itself, so a host that re-resolves to a
+    different address between this check and the request is not caught.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise BlockedURLError(f"Only http and https URLs are allowed: {url}")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except (ValueError, OSError) as e:
+        raise FetchError(f"Cannot resolve {parts.hostname}: {e}") from e
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            raise BlockedURLError(f"{parts.hostname} resolves to non-public address {address}")
+
+
+@dataclass
+class FetchResult:
+    """Location and identity of a downloaded body"""
+    url: str
+    path: Path
+    content_hash: str
+    size: int
+    from_cache: bool
+
+
+class ImageFetcher:
+    """Downloads images into an on-disk cache through one pooled session"""
+
+    def __init__(
+        self,
+        cache_dir: Optional[Union[str, Path]] = None,
+        timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        pool_size: int = 8,
+        session: Optional[requests.Session] = None,
+        cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+        cache_max_age: float = DEFAULT_CACHE_MAX_AGE,
+    ):
+        if cache_dir is None:
+            cache_dir = Path(tempfile.gettempdir()) / "image_fetch_cache"
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.pool_size = pool_size
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_max_age = cache_max_age
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def _cache_paths(self, url: str) -> Tuple[Path, Path]:
+        """Body and metadata paths for a URL"""
+        name = hashlib.sha256(url.encode()).hexdigest()
+        return self.cache_dir / f"{name}.body", self.cache_dir / f"{name}.json"
+
+    def prune(self, keep: Optional[Path] = None):
+        """Drop cached bodies older than cache_max_age, then the least recently
+        used ones until the cache fits in cache_max_bytes (keep is never dropped)"""
+        now = time.time()
+        entries = []
+        for path in self.cache_dir.iterdir():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.suffix == ".body":
+                entries.append((stat.st_mtime, stat.st_size, path))
+            elif path.suffix in (".part", ".tmp") and now - stat.st_mtime > self.cache_max_age:
+                # Left behind by a killed download
+                path.unlink(missing_ok=True)
+
+        total = 0
+        for mtime, size, body_path in sorted(entries, reverse=True):
+            if body_path == keep or (now - mtime <= self.cache_max_age and total + size <= self.cache_max_bytes):
+                total += size
+                continue
+            for path in (body_path, body_path.with_suffix(".json")):
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError:
+                    # Still open elsewhere (Windows); try again next time
+                    pass
+
+    def _load_meta(self, url: str) -> Optional[dict]:
+        """Read cached metadata if both the body and metadata exist"""
+        body_path, meta_path = self._cache_paths(url)
+        if not (body_path.exists() and meta_path.exists()):
+            return None
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _stream_to_cache(self, url: str, response: requests.Response) -> FetchResult:
+        """Stream a 200 response to disk, enforcing the size limit"""
+        declared = response.headers.get("Content-Length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            raise ImageTooLargeError(f"{url} is {declared} bytes (limit {self.max_bytes})")
+
+        body_path, meta_path = self._cache_paths(url)
+        hasher = new_hasher()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageTooLargeError(f"{url} exceeds {self.max_bytes} bytes")
+                    hasher.update(chunk)
+                    f.write(chunk)
+            # Atomic rename so concurrent readers never see a partial body
+            os.replace(tmp_name, body_path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            raise
+
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": hasher.hexdigest(),
+            "size": size,
+        }
+        tmp_meta = meta_path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+        return FetchResult(url, body_path, meta["content_hash"], size, from_cache=False)
+
+    def _get(self, url: str, headers: dict, url_check: Optional[Callable[[str], None]]) -> requests.Response:
+        """GET with redirects; with a url_check, every hop is checked before it is requested"""
+        if url_check is None:
+            return self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+        for _ in range(MAX_REDIRECTS + 1):
+            url_check(url)
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True, allow_redirects=False)
+            if not response.is_redirect:
+                return response
+            response.close()
+            url = urljoin(response.url, response.headers["Location"])
+        raise FetchError(f"Too many redirects fetching {url}")
+
+    def fetch(self, url: str, url_check: Optional[Callable[[str], None]] = None) -> FetchResult:
+        """Download a URL (or revalidate the cached copy) and return its location
+
+        url_check (e.g. check_public_url) is called on the URL and on every
+        redirect target, and raises to refuse it.
+        """
+        meta = self._load_meta(url)
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            response = self._get(url, headers, url_check)
+        except requests.RequestException as e:
+            raise FetchError(f"Failed to fetch {url}: {e}") from e
+
+        with response:
+            if response.status_code == 304 and meta is not None:
+                body_path, _ = self._cache_paths(url)
+                # Mark as recently used for prune()
+                os.utime(body_path)
+                return FetchResult(url, body_path, meta["content_hash"], meta["size"], from_cache=True)
+            if response.status_code != 200:
+                raise FetchError(f"Failed to fetch {url}: HTTP {response.status_code}")
+            try:
+                result = self._stream_to_cache(url, response)
+            except requests.RequestException as e:
+                raise FetchError(f"Failed to fetch {url}: {e}") from e
+        self.prune(keep=result.path)
+        return result
+
+    def fetch_image(self, url: str) -> Image.Image:
+        """Fetch a URL and open it lazily from the cached file"""
+        return Image.open(self.fetch(url).path)
+
+    def prefetch(self, urls: Iterable[str], max_workers: Optional[int] = None) -> Dict[str, Union[FetchResult, Exception]]:
+        """Fetch several URLs concurrently; failures are returned, not raised"""
+        urls = list(dict.fromkeys(urls))
+        workers = max_workers or self.pool_size
+
+        def safe_fetch(url):
+            try:
+                return self.fetch(url)
+            except FetchError as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(urls, executor.map(safe_fetch, urls)))
+
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+
+
+_default_fetcher: Optional[ImageFetcher] = None
+_default_lock = threading.Lock()
+
+
+def get_default_fetcher() -> ImageFetcher:
+    """Process-wide fetcher shared by the scripts and Streamlit sessions"""
+    global _default_fetcher
+    with _default_lock:
+        if _default_fetcher is None:
+            _default_fetcher = ImageFetcher()
+        return _default_fetcher
+
+
+if __name__ == "__main__":
+    import sys
+
+    for url, result in get_default_fetcher().prefetch(sys.argv[1:]).items():
+        if isinstance(result, Exception):
+            print(f"FAILED  {url}: {result}")
+        else:
+            source = "cache" if result.from_cache else "network"
+            print(f"{result.size:>10} bytes  {source:<7}  {url}")
@@ -0,0 +1,26 @@
+
+import numpy as np
+from PIL import Image
+
+
+def rgb_to_gray(rgb: np.ndarray) -> np.ndarray:
+    """ITU-R 601-2 luma from an (..., H, W, 3) uint8 array, bit-exact with PIL's convert("L")
+
+    The pixels are already decoded, so PIL's C conversion is just one pass
+    over memory; it is much faster and lighter than widening every channel
+    to uint32 in NumPy.
+    """
+    if rgb.ndim > 3:
+        # Batch of images: convert one at a time
+        out = np.empty(rgb.shape[:-1], dtype=np.uint8)
+        for index in np.ndindex(rgb.shape[:-3]):
+            out[index] = rgb_to_gray(rgb[index])
+        return out
+    return np.asarray(Image.fromarray(np.ascontiguousarray(rgb), "RGB").convert("L"))
+
+
+def channel_image(rgb: np.ndarray, channel: int) -> np.ndarray:
+    """RGB image keeping only one channel (0=red, 1=green, 2=blue)"""
+    out = np.zeros_like(rgb)
+    out[..., channel] = rgb[..., channel]
+    return out
@@ -0,0 +1,166 @@
+"""
+Lazy stage-graph image pipeline
+
+Each product (array, channel images, grayscale, colormap, statistics) is a
+stage with declared inputs. Asking for one product computes only its
+ancestors, and every result is memoised on the pipeline and stored in the
+shared derived-product cache, so a rerun that only changes the colormap
+recomputes nothing but the colormap.
+
+    pipeline = ImagePipeline(content_hash, lambda: Image.open(path), colormap="inferno")
+    colored = pipeline.get("colormap")   # runs image -> array -> gray -> colormap
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from colormap_lut import apply_colormap
+from image_cache import DerivedCache, derived_cache
+from image_ops import channel_image, rgb_to_gray
+from image_stats import compute_histograms, statistics_from_histograms
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One node of the graph: func(*inputs, **params)"""
+    name: str
+    func: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+    params: Tuple[str, ...] = ()
+    cached: bool = True
+
+
+STAGES: Dict[str, Stage] = {}
+
+
+def register_stage(name: str, inputs: Tuple[str, ...] = (), params: Tuple[str, ...] = ()):
+    """Decorator adding a stage to the graph"""
+    def decorator(func):
+        STAGES[name] = Stage(name, func, tuple(inputs), tuple(params))
+        return func
+    return decorator
+
+
+@register_stage("array", inputs=("image",))
+def _to_array(image: Image.Image) -> np.ndarray:
+    # convert() would copy an image that is already RGB
+    return np.asarray(image if image.mode == "RGB" else image.convert("RGB"))
+
+
+@register_stage("red", inputs=("array",))
+def _red(array: np.ndarray) -> np.ndarray:
+    return channel_image(array, 0)
+
+
+@register_stage("green", inputs=("array",))
+def _green(array: np.ndarray) -> np.ndarray:
+    return channel_image(array, 1)
+
+
+@register_stage("blue", inputs=("array",))
+def _blue(array: np.ndarray) -> np.ndarray:
+    return channel_image(array, 2)
+
+
+@register_stage("gray", inputs=("array",))
+def _gray(array: np.ndarray) -> np.ndarray:
+    # From the decoded array; no second decode of the source image
+    return rgb_to_gray(array)
+
+
+@register_stage("colormap", inputs=("gray",), params=("colormap",))
+def _colormap(gray: np.ndarray, colormap: str) -> np.ndarray:
+    return apply_colormap(gray, colormap)
+
+
+@register_stage("histograms", inputs=("array", "gray"))
+def _histograms(array: np.ndarray, gray: np.ndarray) -> np.ndarray:
+    return compute_histograms(array, gray)
+
+
+@register_stage("stats", inputs=("histograms",))
+def _stats(histograms: np.ndarray) -> dict:
+    return statistics_from_histograms(histograms)
+
+
+class ImagePipeline:
+    """Lazily evaluated products of one source image
+
+    source_key identifies the source content (e.g. its content hash) and load
+    returns the decoded PIL image; it is the graph's "image" stage. Keyword
+    params feed the stages that declare them (e.g. colormap); level, if given,
+    distinguishes pyramid levels of the same source in the cache.
+    """
+
+    def __init__(
+        self,
+        source_key: str,
+        load: Callable[[], Image.Image],
+        cache: Optional[DerivedCache] = derived_cache,
+        level: int = 0,
+        **params,
+    ):
+        self.source_key = source_key
+        self.cache = cache
+        self.level = level
+        self.params = params
+        self.stages = dict(STAGES)
+        # The loader manages its own caching (e.g. the image pyramid)
+        self.stages["image"] = Stage("image", load, cached=False)
+        self.timings: Dict[str, float] = {}
+        self._values: Dict[str, Any] = {}
+
+    def ancestors(self, name: str) -> List[str]:
+        """Stages needed for name, inputs first"""
+        order: List[str] = []
+
+        def visit(stage_name):
+            if stage_name in order:
+                return
+            if stage_name not in self.stages:
+                raise KeyError(f"Unknown stage: {stage_name}")
+            for input_name in self.stages[stage_name].inputs:
+                visit(input_name)
+            order.append(stage_name)
+
+        visit(name)
+        return order
+
+    def _key_params(self, name: str) -> Dict[str, Any]:
+        """Params the stage's result depends on, including those of its ancestors"""
+        used = {param for stage in self.ancestors(name) for param in self.stages[stage].params}
+        return {param: self.params[param] for param in sorted(used)}
+
+    def get(self, name: str) -> Any:
+        """Return a product, computing only the stages it depends on"""
+        if name in self._values:
+            return self._values[name]
+
+        stage = self.stages[name]
+        key_params = self._key_params(name)
+        key = None
+        if self.cache is not None and stage.cached:
+            key = self.cache.make_key(self.source_key, name, level=self.level, **key_params)
+            value = self.cache.get(key)
+            if value is not None:
+                self._values[name] = value
+                return value
+
+        inputs = [self.get(input_name) for input_name in stage.inputs]
+        start = time.perf_counter()
+        value = stage.func(*inputs, **{param: self.params[param] for param in stage.params})
+        self.timings[name] = time.perf_counter() - start
+
+        if key is not None:
+            self.cache.put(key, value)
+        self._values[name] = value
+        return value
+
+    @property
+    def computed(self) -> List[str]:
+        """Stages actually run by this pipeline (cache hits excluded)"""
+        return list(self.timings)
@@ -1,9 +1,12 @@
 import streamlit as st
-import numpy as np
-from PIL import Image
-import requests
-from io import BytesIO
-import matplotlib.pyplot as plt
+import pandas as pd
+from colormap_lut import COLORMAPS
+from image_cache import derived_cache
+from image_pipeline import ImagePipeline
+from image_pyramid import ORIGINAL_DISPLAY_WIDTH, COLUMN_DISPLAY_WIDTH
+from image_source import select_image_source
+from image_stats import CHANNELS, summary
+from stage_timer import StageTimer
 
 # Set Streamlit page config
 st.set_page_config(page_title="Image Processor", layout="wide")
@@ -11,59 +14,93 @@ st.set_page_config(page_title="Image Processor", layout="wide")
 # Title
 st.title("Image - Multi-Color Channel Visualizer")
 
-# Load image from URL
-@st.cache_data
-def load_image():
-    url = "https://st1.latestly.com/wp-content/uploads/2025/05/Virat-Kohli-Wallpapers-in-Test-Format-14.jpg"
-    response = requests.get(url)
-    return Image.open(BytesIO(response.content)).convert("RGB")
+# Opt-in per-stage timing panel
+timer = StageTimer(enabled=st.sidebar.checkbox("Show stage timings", value=False))
 
-# Load and display image
-virat = load_image()
-st.image(virat, caption="Original Image", use_container_width=True)
+# Pick an upload, local path or URL (defaults to the original URL)
+DEFAULT_URL = "https://st1.latestly.com/wp-content/uploads/2025/05/Virat-Kohli-Wallpapers-in-Test-Format-14.jpg"
+with timer.stage("source"):
+    source = select_image_source(default_url=DEFAULT_URL)
+if source is None:
+    st.info("Choose an image in the sidebar.")
+    st.stop()
+
+# Decode only the resolution each slot is shown at, unless full resolution is requested
+full_resolution = st.sidebar.checkbox("Decode full resolution", value=False)
+virat_key = source.content_hash
+pyramid = source.pyramid()
 
-# Convert to NumPy array
-virat_np = np.array(virat)
-R, G, B = virat_np[:, :, 0], virat_np[:, :, 1], virat_np[:, :, 2]
+def level_for(display_width):
+    return 0 if full_resolution else pyramid.level_for_width(display_width)
 
-# Create channel images
-red_img = np.zeros_like(virat_np)
-green_img = np.zeros_like(virat_np)
-blue_img = np.zeros_like(virat_np)
+display_level = level_for(ORIGINAL_DISPLAY_WIDTH)
+column_level = level_for(COLUMN_DISPLAY_WIDTH)
+
+# Load and display image
+with timer.stage("decode"):
+    virat = pyramid.get_level(display_level)
+with timer.stage("st.image (original)"):
+    st.image(virat, caption="Original Image", use_container_width=True)
+st.caption(f"Full size {pyramid.full_size[0]}x{pyramid.full_size[1]}, shown at {virat.width}x{virat.height}")
 
-red_img[:, :, 0] = R
-green_img[:, :, 1] = G
-blue_img[:, :, 2] = B
+# Channel images are computed lazily at column resolution
+column_pipeline = ImagePipeline(virat_key, lambda: pyramid.get_level(column_level), level=column_level)
 
 # Display RGB channels
 st.subheader("RGB Channel Visualization")
 col1, col2, col3 = st.columns(3)
 
-with col1:
-    st.image(red_img, caption="Red Channel", use_container_width=True)
+with timer.stage("channels"):
+    red_img = column_pipeline.get("red")
+    green_img = column_pipeline.get("green")
+    blue_img = column_pipeline.get("blue")
 
-with col2:
-    st.image(green_img, caption="Green Channel", use_container_width=True)
+with timer.stage("st.image (channels)"):
+    with col1:
+        st.image(red_img, caption="Red Channel", use_container_width=True)
 
-with col3:
-    st.image(blue_img, caption="Blue Channel", use_container_width=True)
+    with col2:
+        st.image(green_img, caption="Green Channel", use_container_width=True)
+
+    with col3:
+        st.image(blue_img, caption="Blue Channel", use_container_width=True)
 
 # Grayscale + Colormap
 st.subheader("Colormapped Grayscale Image")
 
-colormap = st.selectbox(
-    "Choose a Matplotlib colormap",
-    ["viridis", "plasma", "inferno", "magma", "cividis", "hot", "cool", "gray"]
-)
-
-virat_gray = virat.convert("L")
-virat_gray_np = np.array(virat_gray)
-
-# Plot using matplotlib with colormap
-fig, ax = plt.subplots(figsize=(6, 4))
-im = ax.imshow(virat_gray_np, cmap=colormap)
-plt.axis("off")
-
-#DO NOT USE : plt.show()
-#USE THIS INSTEAD:
-st.pyplot(fig)
\ No newline at end of file
+colormap = st.selectbox("Choose a Matplotlib colormap", COLORMAPS)
+
+# Grayscale comes from the decoded array and the colormap from a lookup table
+display_pipeline = ImagePipeline(virat_key, lambda: virat, level=display_level, colormap=colormap)
+with timer.stage("gray + colormap"):
+    virat_colored = display_pipeline.get("colormap")
+with timer.stage("st.image (colormap)"):
+    st.image(virat_colored, caption=f"Grayscale ({colormap})", use_container_width=True)
+
+# Per-channel statistics, cached next to the other products (no extra decode)
+st.subheader("Channel Statistics")
+
+with timer.stage("stats"):
+    virat_stats = display_pipeline.get("stats")
+with timer.stage("st.dataframe / chart"):
+    st.dataframe(pd.DataFrame(summary(virat_stats)).T, use_container_width=True)
+    st.line_chart(pd.DataFrame({name: virat_stats[name]["histogram"] for name in CHANNELS}))
+
+# Shared derived-product cache counters
+with st.sidebar.expander("Cache statistics"):
+    st.json(derived_cache.get_stats())
+
+# Where this rerun spent its time
+if timer.enabled:
+    with st.sidebar.expander("Stage timings", expanded=True):
+        st.dataframe(
+            pd.DataFrame(timer.rows(), columns=["stage", "ms", "share"]).set_index("stage"),
+            use_container_width=True,
+        )
+        # Pipeline stages that actually ran this rerun (everything else was a cache hit)
+        computed = [
+            f"{name} (level {pipeline.level}) {seconds * 1000:.1f} ms"
+            for pipeline in (column_pipeline, display_pipeline)
+            for name, seconds in pipeline.timings.items()
+        ]
+        st.caption(", ".join(computed) or "all cached")
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""
+Unified image sources for the apps: uploads, local paths and URLs
+
+Every source ends up as a file on disk plus its content hash, which is what
+ImagePyramid and the derived-product cache are keyed on. Uploads are spooled
+to a temp file in chunks and decoded lazily from there. Byte size and pixel
+count limits are checked before any full decode, using only the image header.
+
+Local paths are only offered when a root directory is configured (the
+path_root argument or IMAGE_ROOT), and anything resolving outside it is
+rejected, so the widget can't be used to read arbitrary files on the server.
+For the same reason URLs are limited to http(s) on public addresses, so the
+server can't be made to fetch from localhost, the LAN or cloud metadata.
+
+Streamlit itself keeps an upload in memory up to server.maxUploadSize (set to
+match MAX_BYTES in .streamlit/config.toml); nothing here adds another copy.
+"""
+
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from PIL import Image
+
+from image_cache import new_hasher
+from image_fetch import FetchError, ImageFetcher, check_public_url, get_default_fetcher
+from image_pyramid import ImagePyramid, file_content_hash
+
+MAX_BYTES = 50 * 1024 * 1024
+MAX_PIXELS = 80_000_000
+CHUNK_SIZE = 1024 * 1024
+SPOOL_DIR = Path(tempfile.gettempdir()) / "image_uploads"
+SPOOL_MAX_AGE = 24 * 60 * 60
+PATH_ROOT_ENV = "IMAGE_ROOT"
+
+
+class ImageSourceError(Exception):
+    """Raised when a source is missing, too large or not an image"""
+
+
+@dataclass
+class ImageSource:
+    """A decodable image file and its identity"""
+    path: Path
+    content_hash: str
+    label: str
+    size: Tuple[int, int]  # (width, height) from the header
+
+    def pyramid(self) -> ImagePyramid:
+        """Lazy display pyramid for this source"""
+        return ImagePyramid(self.path, self.content_hash)
+
+
+def check_image(path: Path, max_pixels: int = MAX_PIXELS) -> Tuple[int, int]:
+    """Validate an image from its header alone and return (width, height)"""
+    try:
+        with Image.open(path) as im:
+            width, height = im.size
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ImageSourceError(f"Not a readable image: {e}") from e
+    if width * height > max_pixels:
+        raise ImageSourceError(
+            f"Image is {width}x{height} ({width * height:,} pixels), limit is {max_pixels:,}"
+        )
+    return width, height
+
+
+def prune_spool(max_age: float = SPOOL_MAX_AGE):
+    """Remove spooled uploads nobody has touched for max_age seconds"""
+    if not SPOOL_DIR.exists():
+        return
+    cutoff = time.time() - max_age
+    for path in SPOOL_DIR.iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def from_upload(uploaded, max_bytes: int = MAX_BYTES, max_pixels: int = MAX_PIXELS) -> ImageSource:
+    """Spool an uploaded file-like object to disk in chunks and validate it"""
+    name = getattr(uploaded, "name", "upload")
+    declared = getattr(uploaded, "size", None)
+    if declared is not None and declared > max_bytes:
+        raise ImageSourceError(f"{name} is {declared:,} bytes, limit is {max_bytes:,}")
+
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    hasher = new_hasher()
+    size = 0
+    if hasattr(uploaded, "seek"):
+        uploaded.seek(0)
+    fd, tmp_name = tempfile.mkstemp(dir=SPOOL_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: uploaded.read(CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageSourceError(f"{name} exceeds {max_bytes:,} bytes")
+                hasher.update(chunk)
+                f.write(chunk)
+        # Identical uploads from different sessions share one spooled file
+        digest = hasher.hexdigest()
+        path = SPOOL_DIR / f"{digest}{Path(name).suffix.lower()}"
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+    try:
+        size_px = check_image(path, max_pixels)
+    except ImageSourceError:
+        path.unlink(missing_ok=True)
+        raise
+    return ImageSource(path, digest, name, size_px)
+
+
+def resolve_local_path(path: Union[str, Path], root: Union[str, Path]) -> Path:
+    """Absolute path for path (relative ones are taken from root); must stay inside root"""
+    root = Path(root).expanduser().resolve()
+    resolved = (root / Path(path).expanduser()).resolve()
+    if not resolved.is_relative_to(root):
+        raise ImageSourceError(f"{path} is outside {root}")
+    return resolved
+
+
+def from_path(
+    path: Union[str, Path],
+    max_bytes: int = MAX_BYTES,
+    max_pixels: int = MAX_PIXELS,
+    root: Optional[Union[str, Path]] = None,
+) -> ImageSource:
+    """Validate a local image file, optionally confined to a root directory"""
+    path = resolve_local_path(path, root) if root is not None else Path(path).expanduser()
+    if not path.is_file():
+        raise ImageSourceError(f"No such file: {path}")
+    if path.stat().st_size > max_bytes:
+        raise ImageSourceError(f"{path} is {path.stat().st_size:,} bytes, limit is {max_bytes:,}")
+    size_px = check_image(path, max_pixels)
+    return ImageSource(path, file_content_hash(path), path.name, size_px)
+
+
+def from_url(
+    url: str,
+    max_bytes: int = MAX_BYTES,
+    max_pixels: int = MAX_PIXELS,
+    fetcher: Optional[ImageFetcher] = None,
+    allow_private: bool = False,
+) -> ImageSource:
+    """Download (or revalidate) a URL through the shared fetch layer and validate it
+
+    Unless allow_private is set, only public http(s) hosts are fetched.
+    """
+    fetcher = fetcher or get_default_fetcher()
+    if max_bytes < fetcher.max_bytes:
+        fetcher = ImageFetcher(
+            fetcher.cache_dir, fetcher.timeout, max_bytes, session=fetcher.session,
+            cache_max_bytes=fetcher.cache_max_bytes, cache_max_age=fetcher.cache_max_age,
+        )
+    try:
+        result = fetcher.fetch(url, url_check=None if allow_private else check_public_url)
+    except FetchError as e:
+        raise ImageSourceError(str(e)) from e
+    size_px = check_image(result.path, max_pixels)
+    return ImageSource(result.path, result.content_hash, url, size_px)
+
+
+def select_image_source(
+    default_url: str = "",
+    default_path: str = "",
+    path_root: Optional[Union[str, Path]] = None,
+) -> Optional[ImageSource]:
+    """Sidebar widgets to pick an upload, local path or URL; returns None until one is given
+
+    "Local path" is only offered when path_root (or $IMAGE_ROOT) is set, and
+    only files under it can be opened.
+    """
+    import streamlit as st
+
+    path_root = path_root or os.environ.get(PATH_ROOT_ENV)
+    options = ["Upload", "Local path", "URL"] if path_root else ["Upload", "URL"]
+    if default_url:
+        default_index = options.index("URL")
+    elif default_path and path_root:
+        default_index = options.index("Local path")
+    else:
+        default_index = 0
+    kind = st.sidebar.radio("Image source", options, index=default_index)
+
+    try:
+        if kind == "Upload":
+            uploaded = st.sidebar.file_uploader("Upload an image", type=["jpg", "jpeg", "png", "bmp", "gif", "tif", "tiff", "webp"])
+            if uploaded is None:
+                return None
+            # Spool once per uploaded file, not on every rerun
+            cache_key = f"image_source_upload_{getattr(uploaded, 'file_id', uploaded.name)}"
+            source = st.session_state.get(cache_key)
+            if source is None or not source.path.exists():
+                prune_spool()
+                source = st.session_state[cache_key] = from_upload(uploaded)
+            # Keep it from being pruned while in use
+            os.utime(source.path)
+            return source
+
+        if kind == "Local path":
+            path = st.sidebar.text_input(f"Image path (under {path_root})", value=default_path)
+            if not path:
+                return None
+            path = resolve_local_path(path, path_root)
+            # Re-hash only when the file changes
+            try:
+                stat = path.stat()
+            except OSError:
+                raise ImageSourceError(f"No such file: {path}")
+            cache_key = f"image_source_path_{path}_{stat.st_mtime_ns}_{stat.st_size}"
+            if cache_key not in st.session_state:
+                st.session_state[cache_key] = from_path(path, root=path_root)
+            return st.session_state[cache_key]
+
+        url = st.sidebar.text_input("Image URL", value=default_url)
+        if not url:
+            return None
+        # Revalidate once per session, not on every rerun
+        cache_key = f"image_source_url_{url}"
+        source = st.session_state.get(cache_key)
+        if source is None or not source.path.exists():
+            source = st.session_state[cache_key] = from_url(url)
+        # Keep it from being pruned from the fetch cache while in use
+        os.utime(source.path)
+        return source
+    except ImageSourceError as e:
+        st.error(str(e))
+        return None
+
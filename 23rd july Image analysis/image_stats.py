@@ -0,0 +1,104 @@
+"""
+Vectorized per-channel histograms and statistics for uint8 images
+
+Everything is derived from 256-bin histograms built with np.bincount, so one
+pass over the pixels gives histograms, mean, std, percentiles and clipping
+ratios. Histograms add up, which makes tiled and batched computation exact.
+
+np.bincount widens its input to intp (8 bytes per value), so planes are
+counted in row strips to keep that temporary small however large the image.
+"""
+
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from image_ops import rgb_to_gray
+
+CHANNELS = ["red", "green", "blue", "gray"]
+DEFAULT_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+# Pixels per bincount call; bounds the intp temporary to ~8 MB
+_STRIP_PIXELS = 1 << 20
+
+
+def _bincount_plane(plane: np.ndarray) -> np.ndarray:
+    """256-bin histogram of a 2-D uint8 plane, counted in row strips"""
+    hist = np.zeros(256, dtype=np.int64)
+    rows = max(1, _STRIP_PIXELS // max(plane.shape[1], 1))
+    for y0 in range(0, plane.shape[0], rows):
+        hist += np.bincount(plane[y0:y0 + rows].ravel(), minlength=256)
+    return hist
+
+
+def compute_histograms(rgb: np.ndarray, gray: Optional[np.ndarray] = None) -> np.ndarray:
+    """(4, 256) int64 histograms for red, green, blue and grayscale
+
+    Pass gray if it has already been computed to avoid converting again.
+    """
+    if rgb.dtype != np.uint8 or rgb.ndim != 3 or rgb.shape[2] != 3:
+        raise ValueError(f"Expected an (H, W, 3) uint8 array, got {rgb.shape} {rgb.dtype}")
+
+    hist = np.empty((4, 256), dtype=np.int64)
+    for c in range(3):
+        hist[c] = _bincount_plane(rgb[..., c])
+    if gray is None:
+        gray = rgb_to_gray(rgb)
+    hist[3] = _bincount_plane(gray)
+    return hist
+
+
+def compute_histograms_batch(images: Sequence[np.ndarray]) -> np.ndarray:
+    """(N, 4, 256) histograms for an (N, H, W, 3) stack or a list of images
+
+    Images are done one at a time, so peak memory is that of the largest
+    single image rather than the whole batch.
+    """
+    if isinstance(images, np.ndarray) and images.ndim == 4:
+        if images.dtype != np.uint8 or images.shape[3] != 3:
+            raise ValueError(f"Expected an (N, H, W, 3) uint8 array, got {images.shape} {images.dtype}")
+    return np.stack([compute_histograms(np.asarray(image)) for image in images])
+
+
+def histogram_stats(hist: np.ndarray, percentiles: Iterable[float] = DEFAULT_PERCENTILES) -> Dict[str, float]:
+    """Mean, std, percentiles and clipping ratios from one 256-bin histogram
+
+    Percentiles use the inverted CDF: the smallest level whose cumulative
+    count reaches the requested fraction.
+    """
+    total = int(hist.sum())
+    if total == 0:
+        raise ValueError("Empty histogram")
+    levels = np.arange(256, dtype=np.float64)
+    mean = float(hist @ levels) / total
+    variance = float(hist @ (levels - mean) ** 2) / total
+    cumulative = np.cumsum(hist)
+
+    stats = {
+        "mean": mean,
+        "std": variance ** 0.5,
+        "min": int(np.flatnonzero(hist)[0]),
+        "max": int(np.flatnonzero(hist)[-1]),
+        "clip_low": float(hist[0]) / total,
+        "clip_high": float(hist[255]) / total,
+    }
+    for p in percentiles:
+        threshold = max(1, int(np.ceil(total * p / 100)))
+        stats[f"p{p:g}"] = int(np.searchsorted(cumulative, threshold))
+    return stats
+
+
+def statistics_from_histograms(hist: np.ndarray) -> Dict[str, dict]:
+    """Statistics for a (4, 256) histogram block, keyed by channel name"""
+    return {
+        name: {"histogram": hist[i], **histogram_stats(hist[i])}
+        for i, name in enumerate(CHANNELS)
+    }
+
+
+def summary(stats: Dict[str, dict]) -> Dict[str, dict]:
+    """Statistics without the histograms, e.g. for a table or JSON"""
+    return {
+        name: {key: value for key, value in channel.items() if key != "histogram"}
+        for name, channel in stats.items()
+    }
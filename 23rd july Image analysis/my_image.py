@@ -1,7 +1,13 @@
+import os
 import streamlit as st
-import numpy as np
-from PIL import Image
-import matplotlib.pyplot as plt
+import pandas as pd
+from colormap_lut import COLORMAPS
+from image_cache import derived_cache
+from image_pipeline import ImagePipeline
+from image_pyramid import ORIGINAL_DISPLAY_WIDTH, COLUMN_DISPLAY_WIDTH
+from image_source import select_image_source
+from image_stats import CHANNELS, summary
+from stage_timer import StageTimer
 
 # Set Streamlit page config
 st.set_page_config(page_title="Guts Image Processor", layout="wide")
@@ -9,56 +15,95 @@ st.set_page_config(page_title="Guts Image Processor", layout="wide")
 # Title
 st.title("Guts Image - Multi-Color Channel Visualizer")
 
-# Load image from URL
-@st.cache_data
-def load_image():
-    path = r'C:\Users\dines\VS codes\image analysis\myimage.jpg'
-    return Image.open(path).convert("RGB")
+# Opt-in per-stage timing panel
+timer = StageTimer(enabled=st.sidebar.checkbox("Show stage timings", value=False))
 
-# Load and display image
-guts = load_image()
-st.image(guts, caption="Original Guts Image", use_container_width=True)
+# Pick an upload, local path or URL (MY_IMAGE_PATH overrides the default path).
+# Local paths are limited to IMAGE_ROOT, or the default image's folder if unset.
+DEFAULT_PATH = os.environ.get("MY_IMAGE_PATH", "myimage.jpg")
+PATH_ROOT = os.environ.get("IMAGE_ROOT") or os.path.dirname(os.path.abspath(os.path.expanduser(DEFAULT_PATH)))
+with timer.stage("source"):
+    source = select_image_source(default_path=DEFAULT_PATH, path_root=PATH_ROOT)
+if source is None:
+    st.info("Choose an image in the sidebar.")
+    st.stop()
+
+# Decode only the resolution each slot is shown at, unless full resolution is requested
+full_resolution = st.sidebar.checkbox("Decode full resolution", value=False)
+guts_key = source.content_hash
+pyramid = source.pyramid()
 
-# Convert to NumPy array
-guts_np = np.array(guts)
-R, G, B = guts_np[:, :, 0], guts_np[:, :, 1], guts_np[:, :, 2]
+def level_for(display_width):
+    return 0 if full_resolution else pyramid.level_for_width(display_width)
 
-# Create channel images
-red_img = np.zeros_like(guts_np)
-green_img = np.zeros_like(guts_np)
-blue_img = np.zeros_like(guts_np)
+display_level = level_for(ORIGINAL_DISPLAY_WIDTH)
+column_level = level_for(COLUMN_DISPLAY_WIDTH)
+
+# Load and display image
+with timer.stage("decode"):
+    guts = pyramid.get_level(display_level)
+with timer.stage("st.image (original)"):
+    st.image(guts, caption="Original Guts Image", use_container_width=True)
+st.caption(f"Full size {pyramid.full_size[0]}x{pyramid.full_size[1]}, shown at {guts.width}x{guts.height}")
 
-red_img[:, :, 0] = R
-green_img[:, :, 1] = G
-blue_img[:, :, 2] = B
+# Channel images are computed lazily at column resolution
+column_pipeline = ImagePipeline(guts_key, lambda: pyramid.get_level(column_level), level=column_level)
 
 # Display RGB channels
 st.subheader("RGB Channel Visualization")
 col1, col2, col3 = st.columns(3)
 
-with col1:
-    st.image(red_img, caption="Red Channel", use_container_width=True)
+with timer.stage("channels"):
+    red_img = column_pipeline.get("red")
+    green_img = column_pipeline.get("green")
+    blue_img = column_pipeline.get("blue")
 
-with col2:
-    st.image(green_img, caption="Green Channel", use_container_width=True)
+with timer.stage("st.image (channels)"):
+    with col1:
+        st.image(red_img, caption="Red Channel", use_container_width=True)
 
-with col3:
-    st.image(blue_img, caption="Blue Channel", use_container_width=True)
+    with col2:
+        st.image(green_img, caption="Green Channel", use_container_width=True)
+
+    with col3:
+        st.image(blue_img, caption="Blue Channel", use_container_width=True)
 
 # Grayscale + Colormap
 st.subheader("Colormapped Grayscale Image")
 
-colormap = st.selectbox(
-    "Choose a Matplotlib colormap",
-    ["viridis", "plasma", "inferno", "magma", "cividis", "hot", "cool", "gray"]
-)
-
-guts_gray = guts.convert("L")
-guts_gray_np = np.array(guts_gray)
-
-# Plot using matplotlib with colormap
-fig, ax = plt.subplots(figsize=(6, 4))
-im = ax.imshow(guts_gray_np, cmap=colormap)
-plt.axis("off")
-
-st.pyplot(fig)
\ No newline at end of file
+colormap = st.selectbox("Choose a Matplotlib colormap", COLORMAPS)
+
+# Grayscale comes from the decoded array and the colormap from a lookup table
+display_pipeline = ImagePipeline(guts_key, lambda: guts, level=display_level, colormap=colormap)
+with timer.stage("gray + colormap"):
+    guts_colored = display_pipeline.get("colormap")
+with timer.stage("st.image (colormap)"):
+    st.image(guts_colored, caption=f"Grayscale ({colormap})", use_container_width=True)
+
+# Per-channel statistics, cached next to the other products (no extra decode)
+st.subheader("Channel Statistics")
+
+with timer.stage("stats"):
+    guts_stats = display_pipeline.get("stats")
+with timer.stage("st.dataframe / chart"):
+    st.dataframe(pd.DataFrame(summary(guts_stats)).T, use_container_width=True)
+    st.line_chart(pd.DataFrame({name: guts_stats[name]["histogram"] for name in CHANNELS}))
+
+# Shared derived-product cache counters
+with st.sidebar.expander("Cache statistics"):
+    st.json(derived_cache.get_stats())
+
+# Where this rerun spent its time
+if timer.enabled:
+    with st.sidebar.expander("Stage timings", expanded=True):
+        st.dataframe(
+            pd.DataFrame(timer.rows(), columns=["stage", "ms", "share"]).set_index("stage"),
+            use_container_width=True,
+        )
+        # Pipeline stages that actually ran this rerun (everything else was a cache hit)
+        computed = [
+            f"{name} (level {pipeline.level}) {seconds * 1000:.1f} ms"
+            for pipeline in (column_pipeline, display_pipeline)
+            for name, seconds in pipeline.timings.items()
+        ]
+        st.caption(", ".join(computed) or "all cached")
\ No newline at end of file
@@ -1,17 +1,19 @@
-import numpy as np # Image processing with NumPy
 import pandas as pd #
 import matplotlib.pyplot as plt # Plotting library
-from PIL import Image
-import requests
-from io import BytesIO # Load image from URL
+from image_source import from_url # Cached, size- and pixel-limited downloads
+from image_pipeline import ImagePipeline # Lazy products: array, channels, gray, colormap
 
 def load_image_from_url(url):
-    response = requests.get(url)
-    return Image.open(BytesIO(response.content))
+    return from_url(url).pyramid() # reduced-resolution decoding
+
+DISPLAY_WIDTH = 600 # 6 inch figure at 100 dpi
 
 virat_url = "https://st1.latestly.com/wp-content/uploads/2025/05/Virat-Kohli-Wallpapers-in-Test-Format-14.jpg"
 #virat_url = "https://img1.hscicdn.com/image/upload/f_auto,t_ds_w_1200,q_50/lsci/db/PICTURES/CMS/401600/401666.jpg"
-virat = load_image_from_url(virat_url)
+virat_pyramid = load_image_from_url(virat_url)
+display_level = virat_pyramid.level_for_width(DISPLAY_WIDTH) # full resolution: level 0
+virat_pipeline = ImagePipeline(virat_pyramid.content_hash, lambda: virat_pyramid.get_level(display_level), level=display_level)
+virat = virat_pipeline.get("image")
 
 #display an original image
 plt.figure(figsize=(6,6))
@@ -21,11 +23,11 @@ plt.axis('off')
 plt.show()
 
 # image to array
-virat_np = np.array(virat)
-print('Virat Image shape', virat_np.shape)
+virat_np = virat_pipeline.get("array")
+print('Virat Image shape', virat_np.shape, 'full size', virat_pyramid.full_size)
 
-#display grayscale image
-virat_gray = virat.convert('L')
+#display grayscale image (from the array, no second conversion of the image)
+virat_gray = virat_pipeline.get("gray")
 
 
 plt.figure(figsize=(6,6))
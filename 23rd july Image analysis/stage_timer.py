@@ -0,0 +1,40 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+
+class StageTimer:
+    """Accumulates wall time per named stage; a disabled timer records nothing"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.records: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block under name"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        """Add seconds to a stage (e.g. timings measured elsewhere)"""
+        if self.enabled:
+            self.records[name] = self.records.get(name, 0.0) + seconds
+
+    def total(self) -> float:
+        """Sum of all recorded stages"""
+        return sum(self.records.values())
+
+    def rows(self) -> List[Tuple[str, float, float]]:
+        """(stage, milliseconds, share of total) sorted slowest first"""
+        total = self.total() or 1.0
+        return [
+            (name, seconds * 1000, seconds / total)
+            for name, seconds in sorted(self.records.items(), key=lambda item: -item[1])
+        ]
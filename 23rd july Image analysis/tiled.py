@@ -0,0 +1,197 @@
+"""
+Tiled, memory-mapped processing for images larger than RAM
+
+The source is read tile by tile and every product (channel planes, grayscale,
+colormap) is written into a memory-mapped .npy file, so peak memory is a few
+tiles per worker regardless of image size.
+
+Sources:
+- .npy arrays are memory-mapped directly
+- uncompressed rasters PIL can describe as one raw RGB block (PPM, raw TIFF)
+  are memory-mapped at their data offset
+- anything else (JPEG, PNG, ...) has no random access, so it is decoded once
+  and spilled to a scratch memmap in a temp directory that is removed afterwards
+
+Usage:
+    python tiled.py scan.ppm --out-dir scan_products --tile-size 1024 --workers 4
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from colormap_lut import scaled_lut
+from image_ops import rgb_to_gray
+from image_stats import compute_histograms, statistics_from_histograms, summary
+
+DEFAULT_TILE_SIZE = 1024
+
+Tile = Tuple[int, int, int, int]  # (y0, y1, x0, x1)
+
+
+def iter_tiles(height: int, width: int, tile_size: int = DEFAULT_TILE_SIZE) -> Iterator[Tile]:
+    """Yield tile bounds covering a height x width image in row-major order"""
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            yield y0, min(y0 + tile_size, height), x0, min(x0 + tile_size, width)
+
+
+def _raw_rgb_memmap(path: Path) -> Optional[np.ndarray]:
+    """Memory-map an uncompressed RGB raster in place, if PIL says it is one"""
+    with Image.open(path) as im:
+        if im.mode != "RGB" or len(im.tile) != 1:
+            return None
+        decoder, extents, offset, args = im.tile[0]
+        rawmode = args[0] if isinstance(args, tuple) else args
+        if decoder != "raw" or rawmode != "RGB" or tuple(extents) != (0, 0) + im.size:
+            return None
+        if isinstance(args, tuple) and len(args) > 1 and args[1] not in (0, im.width * 3):
+            # Padded or bottom-up rows
+            return None
+        width, height = im.size
+    return np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(height, width, 3))
+
+
+def open_source(
+    path: Union[str, Path],
+    scratch_dir: Union[str, Path],
+    tile_size: int = DEFAULT_TILE_SIZE,
+) -> np.ndarray:
+    """Open an image as an (H, W, 3) uint8 array backed by a file, not RAM
+
+    Compressed inputs are spilled to scratch_dir, which the caller owns.
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".npy":
+        array = np.load(path, mmap_mode="r")
+        if array.ndim != 3 or array.shape[2] != 3 or array.dtype != np.uint8:
+            raise ValueError(f"{path} must hold an (H, W, 3) uint8 array, got {array.shape} {array.dtype}")
+        return array
+
+    array = _raw_rgb_memmap(path)
+    if array is not None:
+        return array
+
+    # Compressed formats: decode once, copy out in strips, then drop the decoded image
+    scratch = Path(scratch_dir) / f"{path.stem}.source.npy"
+    with Image.open(path) as im:
+        # convert() would copy an image that is already RGB
+        rgb = im if im.mode == "RGB" else im.convert("RGB")
+        width, height = rgb.size
+        array = np.lib.format.open_memmap(scratch, mode="w+", dtype=np.uint8, shape=(height, width, 3))
+        for y0 in range(0, height, tile_size):
+            y1 = min(y0 + tile_size, height)
+            array[y0:y1] = np.asarray(rgb.crop((0, y0, width, y1)))
+        array.flush()
+        del array, rgb
+    return np.load(scratch, mmap_mode="r")
+
+
+def process_tiled(
+    path: Union[str, Path],
+    out_dir: Union[str, Path],
+    colormap: str = "viridis",
+    tile_size: int = DEFAULT_TILE_SIZE,
+    workers: int = 1,
+    scratch_dir: Optional[Union[str, Path]] = None,
+) -> Dict[str, Path]:
+    """Write channel planes, grayscale and colormap products as .npy memmaps
+
+    Per-channel statistics are accumulated from the same tiles and written to
+    stats.json (histograms to histograms.npy). Compressed inputs are spilled
+    to a temporary directory under scratch_dir (default: the system temp
+    dir) that is deleted before returning.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="tiled_", dir=scratch_dir) as scratch:
+        source = open_source(path, scratch, tile_size)
+        try:
+            return _process_source(source, out_dir, colormap, tile_size, workers)
+        finally:
+            # Release the scratch memmap before its directory is removed
+            del source
+
+
+def _process_source(
+    source: np.ndarray,
+    out_dir: Path,
+    colormap: str,
+    tile_size: int,
+    workers: int,
+) -> Dict[str, Path]:
+    """Tile loop behind process_tiled"""
+    height, width = source.shape[:2]
+
+    paths = {
+        "red": out_dir / "red.npy",
+        "green": out_dir / "green.npy",
+        "blue": out_dir / "blue.npy",
+        "gray": out_dir / "gray.npy",
+        "colormap": out_dir / f"colormap_{colormap}.npy",
+        "histograms": out_dir / "histograms.npy",
+        "stats": out_dir / "stats.json",
+    }
+    planes = {
+        name: np.lib.format.open_memmap(paths[name], mode="w+", dtype=np.uint8, shape=(height, width))
+        for name in ("red", "green", "blue", "gray")
+    }
+    colored = np.lib.format.open_memmap(paths["colormap"], mode="w+", dtype=np.uint8, shape=(height, width, 3))
+    tiles = list(iter_tiles(height, width, tile_size))
+
+    # Pass 1: channels, grayscale and histograms (which also give the global gray range)
+    def split_tile(tile: Tile) -> np.ndarray:
+        y0, y1, x0, x1 = tile
+        rgb = np.asarray(source[y0:y1, x0:x1])
+        planes["red"][y0:y1, x0:x1] = rgb[..., 0]
+        planes["green"][y0:y1, x0:x1] = rgb[..., 1]
+        planes["blue"][y0:y1, x0:x1] = rgb[..., 2]
+        gray = rgb_to_gray(rgb)
+        planes["gray"][y0:y1, x0:x1] = gray
+        return compute_histograms(rgb, gray)
+
+    # Pass 2: colormap with the global range so tiles match the whole-image result
+    def colormap_tile(tile: Tile):
+        y0, y1, x0, x1 = tile
+        colored[y0:y1, x0:x1] = lut[planes["gray"][y0:y1, x0:x1]]
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        hist = sum(executor.map(split_tile, tiles))
+        stats = statistics_from_histograms(hist)
+        lut = scaled_lut(colormap, stats["gray"]["min"], stats["gray"]["max"])
+        list(executor.map(colormap_tile, tiles))
+
+    np.save(paths["histograms"], hist)
+    with open(paths["stats"], "w") as f:
+        json.dump(summary(stats), f, indent=2)
+
+    for array in (*planes.values(), colored):
+        array.flush()
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiled channel / grayscale / colormap processing")
+    parser.add_argument("image", help="Image file or (H, W, 3) uint8 .npy array")
+    parser.add_argument("--out-dir", default=None, help="Output directory (default: <image>_tiles)")
+    parser.add_argument("--colormap", default="viridis")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--scratch-dir", default=None, help="Where compressed inputs are spilled (default: temp dir)")
+    args = parser.parse_args()
+
+    out_dir = args.out_dir or f"{Path(args.image).with_suffix('')}_tiles"
+    paths = process_tiled(args.image, out_dir, args.colormap, args.tile_size, args.workers, args.scratch_dir)
+    for name, path in paths.items():
+        print(f"{name:<11} {path}")
+
+
+if __name__ == "__main__":
+    main()